@@ -12,7 +12,7 @@ setup(name='xemutestagent',
 	author_email='contact@mborgerson.com',
 	url='https://github.com/mborgerson/xemu-test',
 	packages=['xemutestagent'],
-	install_requires=['requests'],
-	extras_require={'docker': ['docker']},
-	python_requires='>=3.6'
+	install_requires=['requests', 'requests-toolbelt', 'urllib3'],
+	extras_require={'docker': ['docker'], 'isal': ['isal']},
+	python_requires='>=3.8'
 	)
@@ -4,12 +4,12 @@ xemu Test Agent
 """
 
 import datetime
-import glob
+import gzip
+import importlib.metadata
 import io
 import json
 import logging
 import os
-import platform
 import requests
 import shutil
 import subprocess
@@ -17,8 +17,13 @@ import sys
 import tarfile
 import tempfile
 import time
+import urllib.parse
+import urllib.request
+import urllib3
+import venv
 
-from typing import Optional, Mapping
+from requests_toolbelt import MultipartEncoder
+from typing import BinaryIO, Optional, Mapping, Tuple
 from zipfile import ZipFile
 
 try:
@@ -26,9 +31,16 @@ try:
 except ImportError:
     docker = None
 
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
+
 
 JOB_MAX_RUNTIME_SECONDS = 300
 JOB_STATUS_UPDATE_INTERVAL_SECONDS = 5
+JOB_LONG_POLL_SECONDS = 60
+JOB_PAYLOAD_MAX_IN_MEMORY_SIZE = 64*1024*1024
 
 AGENT_VERSION = '0'
 AGENT_PKG_URL = 'https://github.com/mborgerson/xemu-test-agent/archive/refs/heads/master.zip'
@@ -39,19 +51,55 @@ TEST_CONTAINER_IMAGE_NAME = 'ghcr.io/mborgerson/xemu-test:master'
 log = logging.getLogger(__name__)
 
 
+def _find_file(dir_path: str, prefix: str, suffix: str) -> str:
+    """
+    Returns the path of the first file in a directory with matching name prefix and suffix.
+    """
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            if entry.name.startswith(prefix) and entry.name.endswith(suffix):
+                return entry.path
+    raise FileNotFoundError(f'No {prefix}*{suffix} file found in {dir_path}')
+
+
+def _extract_tar(tar: tarfile.TarFile, dir_path: str):
+    """
+    Extracts all members of a tar archive, refusing any that would be placed outside of the target directory.
+    """
+    if hasattr(tarfile, 'data_filter'):
+        tar.extractall(path=dir_path, filter='data')
+        return
+
+    def checked_members():
+        root = os.path.realpath(dir_path)
+        for member in tar:
+            paths = [os.path.join(root, member.name)]
+            if member.issym():
+                paths.append(os.path.join(root, os.path.dirname(member.name), member.linkname))
+            elif member.islnk():
+                paths.append(os.path.join(root, member.linkname))
+            for path in paths:
+                if os.path.commonpath([root, os.path.realpath(path)]) != root:
+                    raise tarfile.TarError(f'Refusing to extract {member.name!r} outside of {dir_path}')
+            yield member
+
+    tar.extractall(path=dir_path, members=checked_members())
+
+
 class Job:
     """
     Work to be done by an agent on a given payload.
     """
 
-    def __init__(self, id_: str, payload_file: tempfile.NamedTemporaryFile, created_at: datetime):
+    def __init__(self, id_: str, payload_file: BinaryIO, created_at: datetime):
         self.id: str = id_
-        self.payload: tempfile.NamedTemporaryFile = payload_file
+        self.payload: BinaryIO = payload_file
         self.created_at: datetime.datetime = created_at
         self.state: str = 'active'
         self.conclusion: str = 'failure'
         self.last_reported_logfile_position: int = 0
-        self.logfile: tempfile.NamedTemporaryFile = tempfile.NamedTemporaryFile(mode='w+', encoding='utf-8')
+        self.last_reported_state: Optional[Tuple[str, str]] = None
+        self.logfile: io.StringIO = io.StringIO()
 
     def __del__(self):
         log.info('Job is deleted!')
@@ -62,10 +110,19 @@ class Job:
             s += f' conclusion={self.conclusion}'
         return f'<Job{s}>'
 
+    def has_unreported_changes(self) -> bool:
+        if self.last_reported_state != (self.state, self.conclusion):
+            return True
+        return self.logfile.seek(0, io.SEEK_END) != self.last_reported_logfile_position
+
     def get_state_update_dict(self) -> Mapping[str, str]:
+        # Log is held in memory; reading from the last reported position only
+        # touches newly appended text and leaves the position at the end for
+        # subsequent writes
         self.logfile.seek(self.last_reported_logfile_position)
         log_text = self.logfile.read()
         self.last_reported_logfile_position = self.logfile.tell()
+        self.last_reported_state = (self.state, self.conclusion)
         return {'state': self.state, 'conclusion': self.conclusion, 'log': log_text}
 
 
@@ -88,8 +145,44 @@ class Agent:
         self._last_status_update_time: float = 0.0
         self._verify_cert = verify_cert
 
+        self._http: urllib3.PoolManager = self._create_orchestrator_pool(orchestrator, verify_cert)
+        self._is_windows: bool = sys.platform == 'win32'
+        self._is_linux: bool = sys.platform.startswith('linux')
+        self._last_release_etag: Optional[str] = None
+        self._last_release_url: Optional[str] = None
+        self._tester_venv_path: str = os.path.expanduser('~/.cache/xemutestagent/venv')
+
         self._job_results_archive_path: Optional[str] = None
 
+    @staticmethod
+    def _create_orchestrator_pool(orchestrator: str, verify_cert: bool) -> urllib3.PoolManager:
+        """
+        Creates the connection pool for orchestrator requests, applying the proxy and CA bundle environment by hand.
+        """
+        # Read errors are not retried so long poll timeouts surface as ReadTimeoutError
+        kwargs = {
+            'num_pools': 1,
+            'maxsize': 4,
+            'cert_reqs': 'CERT_REQUIRED' if verify_cert else 'CERT_NONE',
+            'retries': urllib3.Retry(total=3, read=False, backoff_factor=0.5),
+        }
+        if verify_cert:
+            ca_bundle = os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE') or requests.certs.where()
+            kwargs['ca_cert_dir' if os.path.isdir(ca_bundle) else 'ca_certs'] = ca_bundle
+
+        url = urllib.parse.urlsplit(orchestrator)
+        proxy_url = urllib.request.getproxies().get(url.scheme)
+        if proxy_url and not urllib.request.proxy_bypass(url.hostname):
+            proxy = urllib3.util.parse_url(proxy_url)
+            proxy_headers = {}
+            if proxy.auth:
+                username, _, password = proxy.auth.partition(':')
+                proxy_auth = urllib.parse.unquote(username) + ':' + urllib.parse.unquote(password)
+                proxy_headers = urllib3.make_headers(proxy_basic_auth=proxy_auth)
+            log.info('Connecting to orchestrator through proxy %s', proxy.host)
+            return urllib3.ProxyManager(proxy_url, proxy_headers=proxy_headers, **kwargs)
+        return urllib3.PoolManager(**kwargs)
+
     def run(self):
         while self._should_run:
             try:
@@ -119,15 +212,22 @@ class Agent:
 
     def _wait_and_execute(self):
         log.info('Waiting for job from orchestrator...')
+        headers = {**self._agent_headers, 'X-XemuTest-LongPoll': str(JOB_LONG_POLL_SECONDS)}
         try:
-            r = requests.get(self._agent_endpoint, headers=self._agent_headers, timeout=10, verify=self._verify_cert)
-        except requests.ReadTimeout:
-            # Apparently requests cannot be interrupted with Ctrl-C? Just use a timeout
-            # to break out within 10s of interrupt
+            # Orchestrator holds the request open until a job is ready or the
+            # long poll period expires, so allow some slack on the read timeout
+            r = self._http.request('GET', self._agent_endpoint, headers=headers,
+                                   timeout=urllib3.Timeout(connect=10, read=JOB_LONG_POLL_SECONDS + 5),
+                                   preload_content=False)
+        except urllib3.exceptions.ReadTimeoutError:
             return
 
-        if r.status_code == 401:
-            if r.text == 'Update Required':
+        if r.status == 204:
+            # No job available, reconnect
+            r.release_conn()
+            return
+        elif r.status == 401:
+            if r.data.decode('utf-8', 'replace') == 'Update Required':
                 log.info('Orchestrator requires agent update')
                 self._update_and_restart()
                 return
@@ -135,18 +235,32 @@ class Agent:
                 log.warning('This agent has not been authorized. Contact admin to get testing token.')
                 self._should_run = False
                 return
-        elif r.status_code != 200:
+        elif r.status != 200:
             log.error('Unexpected response from orchestrator.')
-            r.raise_for_status()
+            r.release_conn()
+            raise urllib3.exceptions.HTTPError(f'Unexpected status {r.status} from {self._agent_endpoint}')
 
         job_id = r.headers['X-XemuTest-JobId']
         job_created_at = datetime.datetime.fromisoformat(r.headers['X-XemuTest-JobCreatedAt'])
         log.info('Received new job %s created at %s', job_id, job_created_at.isoformat())
 
         log.info('Receiving payload...')
-        job_payload_file = tempfile.NamedTemporaryFile(prefix='job-payload-')
-        for chunk in r.iter_content(chunk_size=1*1024*1024):
+        # Keep small payloads in memory, only spilling to disk once they grow large.
+        # SpooledTemporaryFile is not used as it lacks seekable() before Python 3.11,
+        # which ZipFile requires.
+        job_payload_file: BinaryIO = io.BytesIO()
+        while True:
+            chunk = r.read(1*1024*1024)
+            if not chunk:
+                break
+            if isinstance(job_payload_file, io.BytesIO) and \
+                    job_payload_file.tell() + len(chunk) > JOB_PAYLOAD_MAX_IN_MEMORY_SIZE:
+                spilled_file = tempfile.NamedTemporaryFile(prefix='job-payload-')
+                spilled_file.write(job_payload_file.getbuffer())
+                job_payload_file = spilled_file
             job_payload_file.write(chunk)
+        r.release_conn()
+        job_payload_file.seek(0)
 
         self.job = Job(job_id, job_payload_file, job_created_at)
         job_log_output_handler = logging.StreamHandler(self.job.logfile)
@@ -159,7 +273,7 @@ class Agent:
             success = False
         self.job.state = 'completed'
         self.job.conclusion = 'success' if success else 'failure'
-        self._post_job_status_update()
+        self._post_job_status_update(final=True)
         log.removeHandler(job_log_output_handler)
         self.job = None
         if self._job_results_archive_path:
@@ -170,10 +284,7 @@ class Agent:
         log.info('Updating tester package')
         self._post_job_status_update()
 
-        release_pkg_url = requests.get(TEST_PKG_RELEASE_URL).json()['assets'][0]['browser_download_url']
-        log.info('Latest tester package is at: %s', release_pkg_url)
-        subprocess.run([sys.executable, '-m', 'pip', 'install', release_pkg_url], check=True)
-        log.info('Installed packages: \n%s', subprocess.check_output(['pip', 'freeze']))
+        self._update_tester_package()
 
         with tempfile.TemporaryDirectory(prefix='xemu-job-') as work_dir:
             success = True
@@ -189,13 +300,19 @@ class Agent:
                 start_time = now
                 last_status_update_time = now
 
-                p = subprocess.Popen([sys.executable, '-m', 'xemutest', self._private_dir_path, results_dir_path],
+                p = subprocess.Popen([self._get_tester_python_path(), '-m', 'xemutest', self._private_dir_path, results_dir_path],
                                      stdout=job_log_file,
                                      stderr=subprocess.STDOUT,
                                      cwd=work_dir)
 
                 while True:
-                    poll_status = p.poll()
+                    # Block until the tester exits or the next status update/timeout is due
+                    deadline = min(start_time + JOB_MAX_RUNTIME_SECONDS,
+                                   last_status_update_time + JOB_STATUS_UPDATE_INTERVAL_SECONDS)
+                    try:
+                        poll_status = p.wait(timeout=max(0, deadline - time.time()))
+                    except subprocess.TimeoutExpired:
+                        poll_status = None
                     now = time.time()
 
                     if poll_status is not None:
@@ -203,15 +320,14 @@ class Agent:
                         if poll_status != 0:
                             success = False
                         break
-                    if (now - start_time) > JOB_MAX_RUNTIME_SECONDS:
+                    if (now - start_time) >= JOB_MAX_RUNTIME_SECONDS:
                         log.info('Tester exceeded maximum time. Terminating.')
                         p.kill()
                         success = False
                         break
-                    if (now - last_status_update_time) > JOB_STATUS_UPDATE_INTERVAL_SECONDS:
+                    if (now - last_status_update_time) >= JOB_STATUS_UPDATE_INTERVAL_SECONDS:
                         self._post_job_status_update()
                         last_status_update_time = now
-                    time.sleep(1)
             except:
                 log.exception('Error occured while executing job!')
                 success = False
@@ -221,44 +337,110 @@ class Agent:
             self._archive_results(results_dir_path)
             return success
 
+    def _get_tester_python_path(self) -> str:
+        if self._is_windows:
+            return os.path.join(self._tester_venv_path, 'Scripts', 'python.exe')
+        return os.path.join(self._tester_venv_path, 'bin', 'python')
+
+    def _get_tester_site_packages_path(self) -> str:
+        if self._is_windows:
+            return os.path.join(self._tester_venv_path, 'Lib', 'site-packages')
+        return os.path.join(self._tester_venv_path, 'lib', f'python{sys.version_info[0]}.{sys.version_info[1]}', 'site-packages')
+
+    def _update_tester_package(self):
+        tester_python = self._get_tester_python_path()
+        # The interpreter is created before pip is bootstrapped, so check for pip to
+        # catch environments left behind by a failed creation
+        if not os.path.isdir(os.path.join(self._get_tester_site_packages_path(), 'pip')):
+            log.info('Creating tester environment at %s', self._tester_venv_path)
+            shutil.rmtree(self._tester_venv_path, ignore_errors=True)
+            try:
+                venv.create(self._tester_venv_path, with_pip=True)
+            except:
+                shutil.rmtree(self._tester_venv_path, ignore_errors=True)
+                raise
+            self._last_release_etag = None
+            self._last_release_url = None
+
+        headers = {'If-None-Match': self._last_release_etag} if self._last_release_etag else {}
+        r = requests.get(TEST_PKG_RELEASE_URL, headers=headers)
+        if r.status_code == 304:
+            log.info('Tester package is up to date: %s', self._last_release_url)
+            return
+        r.raise_for_status()
+
+        release_pkg_url = r.json()['assets'][0]['browser_download_url']
+        log.info('Latest tester package is at: %s', release_pkg_url)
+        if release_pkg_url != self._last_release_url:
+            # Relay installer output to the job log as it runs, keeping the orchestrator updated
+            args = [tester_python, '-m', 'pip', 'install', '--upgrade', release_pkg_url]
+            last_status_update_time = time.time()
+            with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True) as p:
+                for line in p.stdout:
+                    log.info('%s', line.rstrip())
+                    now = time.time()
+                    if (now - last_status_update_time) >= JOB_STATUS_UPDATE_INTERVAL_SECONDS:
+                        self._post_job_status_update()
+                        last_status_update_time = now
+            if p.returncode != 0:
+                raise subprocess.CalledProcessError(p.returncode, args)
+
+            dists = importlib.metadata.distributions(path=[self._get_tester_site_packages_path()])
+            log.info('Installed packages: \n%s', '\n'.join(sorted(f"{d.metadata['Name']}=={d.version}" for d in dists)))
+            self._last_release_url = release_pkg_url
+
+        # Only cache the tag once the release is installed so a failed install is retried
+        self._last_release_etag = r.headers.get('ETag')
+
     def _extract_payload(self, target_dir_path: str):
         log.info('Extracting job payload')
-        original_cwd = os.getcwd()
-        os.chdir(target_dir_path)
-        try:
-            with ZipFile(self.job.payload, 'r') as zip_obj:
-                zip_obj.extractall()
-            log.info('Package directory listing:')
-            for f in os.listdir('.'):
-                log.info('- %s', f)
-
-            log.info('Extracting build package')
-            if platform.system() == 'Windows':
-                release_zip = glob.glob('xemu-win-*.zip')[0]
-                with ZipFile(release_zip, 'r') as zip_obj:
-                    zip_obj.extractall()
-                os.unlink(release_zip)
-            elif platform.system() == 'Linux':
-                subprocess.run(['tar', 'xf', glob.glob(f'xemu-*.tgz')[0]], check=True)
-            else:
-                assert False, 'Unsupported agent platform'
-
-            log.info('Package directory listing:')
-            for f in os.listdir('.'):
-                log.info('- %s', f)
-        finally:
-            os.chdir(original_cwd)
+        with ZipFile(self.job.payload, 'r') as zip_obj:
+            zip_obj.extractall(path=target_dir_path)
+        log.info('Package directory listing:')
+        for f in os.listdir(target_dir_path):
+            log.info('- %s', f)
+
+        log.info('Extracting build package')
+        if self._is_windows:
+            release_zip = _find_file(target_dir_path, 'xemu-win-', '.zip')
+            with ZipFile(release_zip, 'r') as zip_obj:
+                zip_obj.extractall(path=target_dir_path)
+            os.unlink(release_zip)
+        elif self._is_linux:
+            with tarfile.open(_find_file(target_dir_path, 'xemu-', '.tgz'), 'r|*') as tar:
+                _extract_tar(tar, target_dir_path)
+        else:
+            assert False, 'Unsupported agent platform'
+
+        log.info('Package directory listing:')
+        for f in os.listdir(target_dir_path):
+            log.info('- %s', f)
+
+    def _post_job_status_update(self, final: bool = False):
+        if not final and not self.job.has_unreported_changes():
+            # Nothing new to report; the next update will carry any accumulated changes
+            return
 
-    def _post_job_status_update(self):
         log.info('Posting job status update')
         state_dict = self.job.get_state_update_dict()
         state_file = io.BytesIO(json.dumps(state_dict).encode('utf-8'))
-        files = [('state', ('state', state_file, 'application/json'))]
+        fields = [('state', ('state', state_file, 'application/json'))]
 
-        if self._job_results_archive_path:
-            files += [('results', ('results.tgz', open(self._job_results_archive_path, 'rb'), 'application/gzip'))]
+        # Results are only uploaded with the final update of the job
+        results_file = None
+        if final and self._job_results_archive_path:
+            results_file = open(self._job_results_archive_path, 'rb')
+            fields += [('results', ('results.tgz', results_file, 'application/gzip'))]
 
-        r = requests.post(self._job_endpoint + '/' + self.job.id, files=files, headers=self._agent_headers, verify=self._verify_cert)
+        try:
+            # Stream the multipart body so the results archive is read from disk
+            # in chunks rather than buffered entirely in memory
+            encoder = MultipartEncoder(fields=fields)
+            headers = {**self._agent_headers, 'Content-Type': encoder.content_type, 'Content-Length': str(encoder.len)}
+            r = self._http.request('POST', self._job_endpoint + '/' + self.job.id, body=encoder, headers=headers)
+        finally:
+            if results_file:
+                results_file.close()
 
     def _archive_results(self, results_dir_path: str):
         archive = tempfile.NamedTemporaryFile(prefix='xemu-results-', suffix='.tgz', delete=False)
@@ -267,7 +449,11 @@ class Agent:
 
         try:
             log.info('Generating results archive')
-            with tarfile.open(self._job_results_archive_path, "w:gz") as tar:
+            # Results are mostly already-compressed media, so favor speed over ratio.
+            # Use ISA-L accelerated DEFLATE when available.
+            gzip_open = igzip.open if igzip is not None else gzip.open
+            with gzip_open(self._job_results_archive_path, 'wb', compresslevel=1) as gz, \
+                 tarfile.open(fileobj=gz, mode='w|') as tar:
                 tar.add(results_dir_path, arcname=os.path.basename(results_dir_path))
         except:
             log.exception('Failed to create results archive')
@@ -282,12 +468,30 @@ class ContainerTestingAgent(Agent):
     """
 
     @staticmethod
-    def copy_from_container(c, src: str, dst: str, **kwargs):
-        subprocess.run(['docker', 'cp', f'{c.name}:{src}', dst], check=True, **kwargs)
+    def reclaim_results(d, results_dir_path: str):
+        """
+        Changes ownership of results written by the container back to the agent user, so they can be cleaned up.
+        """
+        if not hasattr(os, 'getuid'):
+            return
+        log.info('Reclaiming ownership of results')
+        # The mounted directory was created by the agent, so its owner maps back to the
+        # agent user under any container uid mapping (e.g. rootless Docker, userns-remap)
+        d.containers.run(TEST_CONTAINER_IMAGE_NAME, ['-R', '--reference=/work/results', '/work/results'],
+                         entrypoint='chown', user='root', network_mode='none', remove=True,
+                         volumes={results_dir_path: {'bind': '/work/results', 'mode': 'rw'}})
 
     @staticmethod
-    def copy_to_container(c, src: str, dst: str, **kwargs):
-        subprocess.run(['docker', 'cp', src, f'{c.name}:{dst}'], check=True, **kwargs)
+    def is_test_image_current(d) -> bool:
+        """
+        Checks whether the local test image matches the registry digest, without pulling layers.
+        """
+        try:
+            remote_digest = d.images.get_registry_data(TEST_CONTAINER_IMAGE_NAME).id
+            local_digests = d.images.get(TEST_CONTAINER_IMAGE_NAME).attrs.get('RepoDigests', [])
+        except docker.errors.APIError:
+            return False
+        return any(digest.endswith('@' + remote_digest) for digest in local_digests)
 
     def _execute_job(self) -> bool:
         """
@@ -296,19 +500,22 @@ class ContainerTestingAgent(Agent):
         assert docker is not None, "Docker package not installed"
         d = docker.from_env()
 
-        log.info('Pulling test container')
-        try:
-            d.images.pull(TEST_CONTAINER_IMAGE_NAME, 'master')
-        except:
-            log.exception('Failed to pull container')
-            raise
+        if self.is_test_image_current(d):
+            log.info('Test container is up to date')
+        else:
+            log.info('Pulling test container')
+            try:
+                d.images.pull(TEST_CONTAINER_IMAGE_NAME, 'master')
+            except:
+                log.exception('Failed to pull container')
+                raise
 
         with tempfile.TemporaryDirectory(prefix='xemu-job-') as temp_path:
             success = True
             inputs_dir_path = os.path.join(temp_path, 'inputs')
             os.makedirs(inputs_dir_path)
             self._extract_payload(inputs_dir_path)
-            shutil.copyfile(glob.glob(f'{inputs_dir_path}/xemu/*.deb')[0],
+            shutil.copyfile(_find_file(os.path.join(inputs_dir_path, 'xemu'), '', '.deb'),
                             os.path.join(inputs_dir_path, 'xemu.deb'))
 
             results_dir_path = os.path.join(temp_path, 'results')
@@ -316,10 +523,14 @@ class ContainerTestingAgent(Agent):
 
             try:
                 log.info('Creating container')
-                c = d.containers.create(TEST_CONTAINER_IMAGE_NAME, detach=True, auto_remove=False, network_mode='none', mem_limit=1280*1024*1024)
-                self.copy_to_container(c, self._private_dir_path, '/work')
-                self.copy_to_container(c, inputs_dir_path, '/work')
-                self.copy_to_container(c, results_dir_path, '/work')
+                # Bind mount job directories rather than copying them in and out of the container
+                volumes = {
+                    self._private_dir_path: {'bind': '/work/' + os.path.basename(self._private_dir_path), 'mode': 'ro'},
+                    inputs_dir_path: {'bind': '/work/inputs', 'mode': 'ro'},
+                    results_dir_path: {'bind': '/work/results', 'mode': 'rw'},
+                }
+                c = d.containers.create(TEST_CONTAINER_IMAGE_NAME, detach=True, auto_remove=False, network_mode='none', mem_limit=1280*1024*1024,
+                                        volumes=volumes)
                 c.start()
             except:
                 log.exception('Failed to launch container')
@@ -331,31 +542,50 @@ class ContainerTestingAgent(Agent):
             last_status_update_time = now
 
             while True:
-                c.reload()
+                # Block until the container exits or the next status update/timeout is due
+                deadline = min(start_time + JOB_MAX_RUNTIME_SECONDS,
+                               last_status_update_time + JOB_STATUS_UPDATE_INTERVAL_SECONDS)
+                try:
+                    result = c.wait(timeout=max(1, deadline - time.time()))
+                except requests.exceptions.ReadTimeout:
+                    result = None
+                except requests.exceptions.ConnectionError as e:
+                    # Some docker/urllib3 versions report the wait timing out as a
+                    # ConnectionError; anything else is a real daemon failure
+                    reason = e.args[0] if e.args else None
+                    reason = getattr(reason, 'reason', reason)
+                    if not isinstance(reason, urllib3.exceptions.ReadTimeoutError):
+                        raise
+                    result = None
 
                 now = time.time()
-                if c.status != 'running':
-                    exit_code = c.attrs['State']['ExitCode']
+                if result is not None:
+                    exit_code = result['StatusCode']
                     log.info('Container exit code: %d', exit_code)
                     if exit_code != 0:
                         success = False
                     break
-                if (now - start_time) > JOB_MAX_RUNTIME_SECONDS:
+                if (now - start_time) >= JOB_MAX_RUNTIME_SECONDS:
                     log.info('Tester exceeded maximum time. Terminating.')
                     c.kill()
                     success = False
                     break
-                if (now - last_status_update_time) > JOB_STATUS_UPDATE_INTERVAL_SECONDS:
+                if (now - last_status_update_time) >= JOB_STATUS_UPDATE_INTERVAL_SECONDS:
                     self._post_job_status_update()
                     last_status_update_time = now
-                time.sleep(1)
 
             # Pack results
             try:
-                self.copy_from_container(c, '/work/results', os.path.dirname(results_dir_path))
+                self.reclaim_results(d, results_dir_path)
+            except:
+                log.exception('Failed to reclaim ownership of results')
+                success = False
+
+            try:
                 log.info('Saving container logs')
                 with open(os.path.join(results_dir_path, 'log.txt'), 'wb') as f:
-                    f.write(c.logs(timestamps=True))
+                    for chunk in c.logs(stream=True, follow=False, timestamps=True):
+                        f.write(chunk)
             except:
                 log.exception('Failed to save logs')
                 success = False